@@ -1,7 +1,11 @@
+import asyncmy
+import asyncmy.cursors
 import mysql.connector
 from mysql.connector import pooling
 import os
+import time
 from dotenv import load_dotenv
+from app.logger import logger
 
 load_dotenv()
 
@@ -11,21 +15,68 @@ DB_CONFIG = {
     'user': os.getenv('DB_USER', 'root'),
     'password': os.getenv('DB_PASSWORD', ''),
     'database': os.getenv('DB_NAME', 'store_monitoring'),
+    'allow_local_infile': True,
+    # DB_USE_PURE=1 forces the pure-Python driver for environments
+    # without the C extension; _create_pool also falls back automatically
+    'use_pure': os.getenv('DB_USE_PURE', '0') == '1',
+    'autocommit': False,
+    # Bound hung connection attempts instead of waiting indefinitely
+    'connection_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', '5')),
+    'consume_results': True,
+    'raise_on_warnings': False,
 }
 
+# Pool tuning (overridable per deployment). The default follows the
+# report executor's worker count (cpu*4) plus headroom for the
+# endpoints, clamped to the connector's hard CNX_POOL_MAXSIZE of 32 -
+# larger values make MySQLConnectionPool raise at import time.
+DEFAULT_POOL_SIZE = min(32, (os.cpu_count() or 4) * 4 + 4)
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', str(DEFAULT_POOL_SIZE)))
+POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '3600'))
+
+def _create_pool():
+    """Create the sync pool on the connector's C extension, falling back
+    to the pure-Python implementation if the extension is unavailable"""
+    try:
+        return pooling.MySQLConnectionPool(
+            pool_name="store_monitoring_pool",
+            pool_size=POOL_SIZE,
+            pool_reset_session=True,
+            **DB_CONFIG
+        )
+    except Exception as e:
+        if not DB_CONFIG.get('use_pure', True):
+            logger.warning(f"mysql-connector C extension unavailable ({e}), "
+                           "falling back to the pure-Python driver")
+            return pooling.MySQLConnectionPool(
+                pool_name="store_monitoring_pool",
+                pool_size=POOL_SIZE,
+                pool_reset_session=True,
+                **dict(DB_CONFIG, use_pure=True)
+            )
+        raise e
+
 # Create connection pool
-connection_pool = pooling.MySQLConnectionPool(
-    pool_name="store_monitoring_pool",
-    pool_size=5,
-    **DB_CONFIG
-)
+connection_pool = _create_pool()
+
+# Track when each pooled connection was first handed out so handles older
+# than POOL_RECYCLE get re-established instead of reused indefinitely
+_connection_ages = {}
 
 def get_connection():
-    """Get a connection from the pool"""
-    return connection_pool.get_connection()
+    """Get a connection from the pool, reconnecting stale handles"""
+    connection = connection_pool.get_connection()
+    now = time.time()
+    age = now - _connection_ages.get(id(connection._cnx), now)
+    if age > POOL_RECYCLE or not connection.is_connected():
+        connection.reconnect(attempts=3, delay=1)
+        age = 0
+    if age == 0:
+        _connection_ages[id(connection._cnx)] = now
+    return connection
 
-def execute_query(query, params=None, fetch=False):
-    """Execute a query and optionally fetch results"""
+def execute_query(query, params=None, fetch=False, return_id=False):
+    """Execute a query and optionally fetch results or the insert id"""
     connection = get_connection()
     cursor = connection.cursor(dictionary=True)
     try:
@@ -33,10 +84,77 @@ def execute_query(query, params=None, fetch=False):
         if fetch:
             return cursor.fetchall()
         connection.commit()
-        return cursor.lastrowid
+        # lastrowid can cost an extra protocol exchange on some driver
+        # configurations, so only read it when the caller wants it
+        if return_id:
+            return cursor.lastrowid
+        return None
     except Exception as e:
         connection.rollback()
         raise e
     finally:
         cursor.close()
-        connection.close() 
\ No newline at end of file
+        connection.close()
+
+# Async pool for request-path queries, created at app startup via the
+# FastAPI lifespan handler. The sync pool above stays in place for the
+# importers and the report generation thread.
+async_pool = None
+
+async def init_async_pool():
+    """Create the async connection pool (called at app startup)"""
+    global async_pool
+    # autocommit keeps read connections out of implicit transactions;
+    # asyncmy's pool closes any connection released mid-transaction, so
+    # without it every SELECT would pay a fresh connect + handshake
+    async_pool = await asyncmy.create_pool(
+        minsize=int(os.getenv('DB_ASYNC_POOL_MIN', '5')),
+        maxsize=int(os.getenv('DB_ASYNC_POOL_MAX', '20')),
+        host=DB_CONFIG['host'],
+        user=DB_CONFIG['user'],
+        password=DB_CONFIG['password'],
+        database=DB_CONFIG['database'],
+        autocommit=True,
+    )
+
+async def close_async_pool():
+    """Close the async connection pool (called at app shutdown)"""
+    global async_pool
+    if async_pool is not None:
+        async_pool.close()
+        await async_pool.wait_closed()
+        async_pool = None
+
+async def execute_query_async(query, params=None, fetch=False):
+    """Async variant of execute_query for endpoint code"""
+    async with async_pool.acquire() as connection:
+        async with connection.cursor(cursor=asyncmy.cursors.DictCursor) as cursor:
+            try:
+                await cursor.execute(query, params or ())
+                if fetch:
+                    return await cursor.fetchall()
+                await connection.commit()
+                return cursor.lastrowid
+            except Exception as e:
+                await connection.rollback()
+                raise e
+
+def execute_query_stream(query, params=None, batch_size=10_000):
+    """Execute a query and yield rows in fetchmany batches
+
+    Streams large result sets instead of materializing one giant list;
+    the connection stays checked out until the generator is exhausted.
+    """
+    connection = get_connection()
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute(query, params or ())
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield row
+    finally:
+        cursor.close()
+        connection.close()
\ No newline at end of file
@@ -1,21 +1,23 @@
 import logging
 import os
 import sys
-from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+from queue import Queue
 
 # Create logs directory if it doesn't exist
 logs_dir = os.path.join(os.getcwd(), 'logs')
 os.makedirs(logs_dir, exist_ok=True)
 
 # Configure logging
-log_file = os.path.join(logs_dir, f'app_{datetime.now().strftime("%Y%m%d")}.log')
+log_file = os.path.join(logs_dir, 'app.log')
 
 # Create logger
 logger = logging.getLogger('store_monitoring')
 logger.setLevel(logging.INFO)
 
-# Create handlers
-file_handler = logging.FileHandler(log_file)
+# Create handlers; rotate at midnight so a long-running process doesn't
+# keep writing to the previous day's file
+file_handler = TimedRotatingFileHandler(log_file, when='midnight', backupCount=7)
 console_handler = logging.StreamHandler(sys.stdout)
 
 # Create formatters
@@ -23,6 +25,13 @@ formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(messag
 file_handler.setFormatter(formatter)
 console_handler.setFormatter(formatter)
 
+# Route records through a queue so hot loops (e.g. the CSV importers)
+# never block on file/stdout writes; a listener thread drains the queue
+# to the real handlers
+log_queue = Queue(-1)
+queue_listener = QueueListener(log_queue, file_handler, console_handler,
+                               respect_handler_level=True)
+queue_listener.start()
+
 # Add handlers to logger
-logger.addHandler(file_handler)
-logger.addHandler(console_handler) 
\ No newline at end of file
+logger.addHandler(QueueHandler(log_queue)) 
\ No newline at end of file
@@ -1,25 +1,34 @@
+import asyncio
 import os
-from fastapi import FastAPI, HTTPException
+import time
+from contextlib import asynccontextmanager
+from fastapi import BackgroundTasks, FastAPI, HTTPException
 from fastapi.responses import FileResponse
 from app.services.report_service import trigger_report, get_report_status
-from app.database import execute_query
+from app.database import execute_query_async, init_async_pool, close_async_pool
 
-app = FastAPI(title="Store Monitoring API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await init_async_pool()
+    yield
+    await close_async_pool()
+
+app = FastAPI(title="Store Monitoring API", lifespan=lifespan)
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to Store Monitoring API"}
 
 @app.post("/trigger_report")
-def api_trigger_report():
+async def api_trigger_report():
     """Trigger a new report generation"""
-    report_id = trigger_report()
+    report_id = await trigger_report()
     return {"report_id": report_id}
 
 @app.get("/get_report")
-def api_get_report(report_id: str):
+async def api_get_report(report_id: str):
     """Get the status of a report or download the report"""
-    report = get_report_status(report_id)
+    report = await get_report_status(report_id)
     
     if not report:
         raise HTTPException(status_code=404, detail="Report not found")
@@ -30,89 +39,83 @@ def api_get_report(report_id: str):
     if report['status'] == 'Error':
         return {"status": "Error", "message": "Report generation failed"}
     
-    # Report is complete, return the file
-    if not os.path.exists(report['file_path']):
+    # Report is complete, return the file; stat once and hand the result
+    # to FileResponse so it doesn't stat the file again
+    try:
+        stat_result = os.stat(report['file_path'])
+    except OSError:
         raise HTTPException(status_code=404, detail="Report file not found")
-    
+
     return FileResponse(
         report['file_path'],
         media_type='text/csv',
-        filename=f'report_{report_id}.csv'
+        filename=f'report_{report_id}.csv',
+        stat_result=stat_result,
+        headers={'Cache-Control': 'no-store'}
     )
 
 # For development/testing purposes
 @app.get("/import_data")
-def import_test_data():
-    """Import test data from CSV files"""
+async def import_test_data(background_tasks: BackgroundTasks):
+    """Schedule an import of test data from CSV files"""
     from app.services.data_service import import_all_data
     data_dir = os.path.join(os.getcwd(), 'data')
-    import_all_data(data_dir)
-    return {"message": "Data import finished"}
+    background_tasks.add_task(import_all_data, data_dir)
+    return {"message": "Import scheduled"}
+
+# Cache /debug_data responses briefly - the aggregate scans are expensive
+# on large tables and the numbers barely change between polls
+DEBUG_DATA_CACHE_TTL = 30  # seconds
+_debug_data_cache = {'expires': 0.0, 'result': None}
 
 # Check data import status
 @app.get("/debug_data")
-def debug_data():
+async def debug_data():
     """Debug endpoint to check data import status with detailed information"""
+    if _debug_data_cache['result'] is not None and time.time() < _debug_data_cache['expires']:
+        return _debug_data_cache['result']
+
     try:
-        # Check store_status table
-        status_query = "SELECT COUNT(*) as count FROM store_status"
-        status_result = execute_query(status_query, fetch=True)
-        status_count = status_result[0]['count'] if status_result else 0
-        
-        # Check business_hours table
-        hours_query = "SELECT COUNT(*) as count FROM business_hours"
-        hours_result = execute_query(hours_query, fetch=True)
-        hours_count = hours_result[0]['count'] if hours_result else 0
-        
-        # Check store_timezones table
-        timezone_query = "SELECT COUNT(*) as count FROM store_timezones"
-        timezone_result = execute_query(timezone_query, fetch=True)
-        timezone_count = timezone_result[0]['count'] if timezone_result else 0
-        
-        # Get distinct store counts
-        distinct_stores_query = "SELECT COUNT(DISTINCT store_id) as count FROM store_status"
-        distinct_stores_result = execute_query(distinct_stores_query, fetch=True)
-        distinct_stores_count = distinct_stores_result[0]['count'] if distinct_stores_result else 0
-        
-        # Check for active/inactive status distribution
-        status_distribution_query = """
-        SELECT status, COUNT(*) as count 
-        FROM store_status 
-        GROUP BY status
-        """
-        status_distribution = execute_query(status_distribution_query, fetch=True)
-        
-        # Check time range of data
-        time_range_query = """
-        SELECT 
-            MIN(timestamp_utc) as earliest_timestamp,
-            MAX(timestamp_utc) as latest_timestamp
-        FROM store_status
-        """
-        time_range = execute_query(time_range_query, fetch=True)
-        
-        # Check business hours coverage
-        business_hours_coverage_query = """
-        SELECT 
-            COUNT(DISTINCT store_id) as stores_with_hours
-        FROM business_hours
-        """
-        business_hours_coverage = execute_query(business_hours_coverage_query, fetch=True)
-        stores_with_hours = business_hours_coverage[0]['stores_with_hours'] if business_hours_coverage else 0
-        
-        # Check timezone coverage
-        timezone_coverage_query = """
-        SELECT 
-            COUNT(DISTINCT store_id) as stores_with_timezone
-        FROM store_timezones
-        """
-        timezone_coverage = execute_query(timezone_coverage_query, fetch=True)
-        stores_with_timezone = timezone_coverage[0]['stores_with_timezone'] if timezone_coverage else 0
-        
-        # Get sample data
-        sample_status = execute_query("SELECT * FROM store_status LIMIT 5", fetch=True)
-        sample_hours = execute_query("SELECT * FROM business_hours LIMIT 5", fetch=True)
-        sample_tz = execute_query("SELECT * FROM store_timezones LIMIT 5", fetch=True)
+        # Run the independent diagnostic queries concurrently on the async
+        # pool; latency is the slowest query rather than the sum
+        queries = [
+            # Row counts, distinct store count and coverage in one statement
+            """
+            SELECT
+                (SELECT COUNT(*) FROM store_status) as status_count,
+                (SELECT COUNT(*) FROM business_hours) as hours_count,
+                (SELECT COUNT(*) FROM store_timezones) as timezone_count,
+                (SELECT COUNT(DISTINCT store_id) FROM store_status) as distinct_stores_count,
+                (SELECT COUNT(DISTINCT store_id) FROM business_hours) as stores_with_hours,
+                (SELECT COUNT(DISTINCT store_id) FROM store_timezones) as stores_with_timezone
+            """,
+            # Active/inactive status distribution
+            "SELECT status, COUNT(*) as count FROM store_status GROUP BY status",
+            # Time range of data
+            "SELECT MIN(timestamp_utc) as earliest_timestamp, MAX(timestamp_utc) as latest_timestamp FROM store_status",
+            # Sample data
+            "SELECT * FROM store_status LIMIT 5",
+            "SELECT * FROM business_hours LIMIT 5",
+            "SELECT * FROM store_timezones LIMIT 5",
+        ]
+        results = await asyncio.gather(
+            *[execute_query_async(query, fetch=True) for query in queries]
+        )
+
+        counts_row = results[0][0] if results[0] else {}
+        status_count = counts_row.get('status_count', 0)
+        hours_count = counts_row.get('hours_count', 0)
+        timezone_count = counts_row.get('timezone_count', 0)
+        distinct_stores_count = counts_row.get('distinct_stores_count', 0)
+        stores_with_hours = counts_row.get('stores_with_hours', 0)
+        stores_with_timezone = counts_row.get('stores_with_timezone', 0)
+
+        status_distribution = results[1]
+        time_range = results[2]
+
+        sample_status = results[3]
+        sample_hours = results[4]
+        sample_tz = results[5]
         
         # Determine import status
         import_status = "Success"
@@ -138,7 +141,7 @@ def debug_data():
         if stores_with_timezone > 0 and stores_with_timezone < distinct_stores_count:
             issues.append(f"Only {stores_with_timezone}/{distinct_stores_count} stores have timezone data")
         
-        return {
+        result = {
             "import_status": import_status,
             "issues": issues,
             "counts": {
@@ -161,6 +164,10 @@ def debug_data():
                 "store_timezones": sample_tz
             }
         }
+
+        _debug_data_cache['result'] = result
+        _debug_data_cache['expires'] = time.time() + DEBUG_DATA_CACHE_TTL
+        return result
     except Exception as e:
         return {
             "import_status": "Error",
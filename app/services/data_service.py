@@ -1,226 +1,332 @@
-import csv
 import os
-from datetime import datetime
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from app.database import execute_query, get_connection
 from app.logger import logger
 
+def _escape_path(file_path):
+    """Escape a file path for embedding in a LOAD DATA statement"""
+    return file_path.replace('\\', '\\\\').replace("'", "\\'")
+
+def _load_data_infile(query):
+    """Execute a LOAD DATA LOCAL INFILE statement as a single bulk load"""
+    connection = get_connection()
+    cursor = connection.cursor()
+    try:
+        cursor.execute(query)
+        connection.commit()
+        return cursor.rowcount
+    except Exception as e:
+        connection.rollback()
+        raise e
+    finally:
+        cursor.close()
+        connection.close()
+
 def import_store_status(file_path):
     """Import store status data from CSV"""
     if not os.path.exists(file_path):
         logger.error(f"Error: File not found - {file_path}")
         return
-    
+
+    # Make re-imports idempotent: replace the table contents rather than
+    # appending duplicates on every /import_data call
+    try:
+        execute_query("TRUNCATE TABLE store_status")
+    except Exception as e:
+        logger.error(f"Error truncating store_status: {e}")
+
     try:
         logger.info(f"Starting import of store status data from {file_path}")
-        with open(file_path, 'r') as file:
-            reader = csv.DictReader(file)
-            batch_size = 1000
-            batch = []
-            count = 0
-            
-            for row in reader:
-                try:
-                    # Parse timestamp
-                    timestamp = datetime.strptime(row['timestamp_utc'].replace(' UTC', ''), 
-                                                '%Y-%m-%d %H:%M:%S.%f')
-                    
-                    batch.append((
-                        row['store_id'],
-                        row['status'],
-                        timestamp.strftime('%Y-%m-%d %H:%M:%S')
-                    ))
-                    count += 1
-                    
-                    if len(batch) >= batch_size:
-                        _insert_store_status_batch(batch)
-                        logger.info(f"Imported {count} store status records")
-                        batch = []
-                except Exception as e:
-                    logger.error(f"Error processing row: {row} - {e}")
-                    continue
-            
-            # Insert remaining records
-            if batch:
-                _insert_store_status_batch(batch)
-                logger.info(f"Imported {count} store status records")
-            
-            logger.info(f"Completed importing store status data. Total records: {count}")
+        query = f"""
+        LOAD DATA LOCAL INFILE '{_escape_path(file_path)}'
+        INTO TABLE store_status
+        FIELDS TERMINATED BY ',' ENCLOSED BY '"'
+        IGNORE 1 LINES
+        (store_id, status, @ts)
+        SET timestamp_utc = STR_TO_DATE(REPLACE(@ts, ' UTC', ''), '%Y-%m-%d %H:%i:%s.%f')
+        """
+        count = _load_data_infile(query)
+        logger.info(f"Completed importing store status data. Total records: {count}")
     except Exception as e:
-        logger.error(f"Error importing store status data: {e}")
+        logger.error(f"Error bulk loading store status data: {e}")
+        logger.info("Falling back to row-based import of store status data")
+        _import_store_status_rows(file_path)
 
-def _insert_store_status_batch(batch):
-    """Insert a batch of store status records"""
-    query = """
-    INSERT INTO store_status (store_id, status, timestamp_utc)
-    VALUES (%s, %s, %s)
-    """
+def _import_store_status_rows(file_path):
+    """Row-based fallback import for servers without LOCAL INFILE support"""
+    # One connection for the whole file; commit every few batches so the
+    # transaction stays bounded without paying a pool checkout per batch
     connection = get_connection()
     cursor = connection.cursor()
     try:
-        logger.debug(f"Executing batch insert of {len(batch)} store status records")
-        cursor.executemany(query, batch)
+        batch_size = 1000
+        commit_every = 10
+        count = 0
+        batches = 0
+
+        # pandas parses the CSV in C, avoiding a Python dict per row
+        for chunk in pd.read_csv(file_path, chunksize=100_000, dtype=str):
+            # Parse the whole timestamp column in one vectorized call; the
+            # driver accepts datetime objects directly, so no re-format
+            parsed = pd.to_datetime(
+                chunk['timestamp_utc'].str.replace(' UTC', '', regex=False),
+                format='%Y-%m-%d %H:%M:%S.%f',
+                errors='coerce'
+            )
+            bad = parsed.isna()
+            if bad.any():
+                for row in chunk[bad].itertuples(index=False):
+                    logger.error(f"Error processing row: {row} - invalid timestamp")
+
+            rows = list(zip(
+                chunk.loc[~bad, 'store_id'],
+                chunk.loc[~bad, 'status'],
+                parsed[~bad].dt.to_pydatetime()
+            ))
+
+            for i in range(0, len(rows), batch_size):
+                _insert_store_status_batch(cursor, rows[i:i + batch_size])
+                batches += 1
+                if batches % commit_every == 0:
+                    connection.commit()
+
+            count += len(rows)
+            logger.info(f"Imported {count} store status records")
+
         connection.commit()
-        logger.debug("Batch insert successful")
+        logger.info(f"Completed importing store status data. Total records: {count}")
     except Exception as e:
         connection.rollback()
-        logger.error(f"Error in batch insert: {e}")
-        raise e
+        logger.error(f"Error importing store status data: {e}")
     finally:
         cursor.close()
         connection.close()
 
+def _insert_store_status_batch(cursor, batch):
+    """Insert a batch of store status records on the caller's connection"""
+    # Build one multi-row INSERT so the whole batch is a single wire packet
+    placeholders = ", ".join(["(%s, %s, %s)"] * len(batch))
+    query = f"INSERT INTO store_status (store_id, status, timestamp_utc) VALUES {placeholders}"
+    flat_params = [value for row in batch for value in row]
+    cursor.execute(query, flat_params)
+
 def import_business_hours(file_path):
     """Import business hours data from CSV"""
     if not os.path.exists(file_path):
         logger.error(f"Error: File not found - {file_path}")
         return
-    
+
+    # Make re-imports idempotent: replace the table contents rather than
+    # appending duplicates on every /import_data call
+    try:
+        execute_query("TRUNCATE TABLE business_hours")
+    except Exception as e:
+        logger.error(f"Error truncating business_hours: {e}")
+
     try:
         logger.info(f"Starting import of business hours data from {file_path}")
-        with open(file_path, 'r') as file:
-            reader = csv.DictReader(file)
-            batch_size = 1000
-            batch = []
-            count = 0
-            
-            for row in reader:
+        query = f"""
+        LOAD DATA LOCAL INFILE '{_escape_path(file_path)}'
+        INTO TABLE business_hours
+        FIELDS TERMINATED BY ',' ENCLOSED BY '"'
+        IGNORE 1 LINES
+        (store_id, day_of_week, start_time_local, end_time_local)
+        """
+        count = _load_data_infile(query)
+        logger.info(f"Completed importing business hours data. Total records: {count}")
+    except Exception as e:
+        logger.error(f"Error bulk loading business hours data: {e}")
+        logger.info("Falling back to row-based import of business hours data")
+        _import_business_hours_rows(file_path)
+
+def _import_business_hours_rows(file_path):
+    """Row-based fallback import for servers without LOCAL INFILE support"""
+    connection = get_connection()
+    cursor = connection.cursor()
+    try:
+        batch_size = 1000
+        commit_every = 10
+        count = 0
+        batches = 0
+
+        for chunk in pd.read_csv(file_path, chunksize=100_000, dtype=str):
+            rows = []
+            for row in chunk.itertuples(index=False):
                 try:
-                    batch.append((
-                        row['store_id'],
-                        int(row['dayOfWeek']),
-                        row['start_time_local'],
-                        row['end_time_local']
+                    rows.append((
+                        row.store_id,
+                        int(row.dayOfWeek),
+                        row.start_time_local,
+                        row.end_time_local
                     ))
-                    count += 1
-                    
-                    if len(batch) >= batch_size:
-                        _insert_business_hours_batch(batch)
-                        logger.info(f"Imported {count} business hours records")
-                        batch = []
                 except Exception as e:
                     logger.error(f"Error processing row: {row} - {e}")
                     continue
-            
-            # Insert remaining records
-            if batch:
-                _insert_business_hours_batch(batch)
-                logger.info(f"Imported {count} business hours records")
-            
-            logger.info(f"Completed importing business hours data. Total records: {count}")
-    except Exception as e:
-        logger.error(f"Error importing business hours data: {e}")
 
-def _insert_business_hours_batch(batch):
-    """Insert a batch of business hours records"""
-    query = """
-    INSERT INTO business_hours (store_id, day_of_week, start_time_local, end_time_local)
-    VALUES (%s, %s, %s, %s)
-    """
-    connection = get_connection()
-    cursor = connection.cursor()
-    try:
-        logger.debug(f"Executing batch insert of {len(batch)} business hours records")
-        cursor.executemany(query, batch)
+            for i in range(0, len(rows), batch_size):
+                _insert_business_hours_batch(cursor, rows[i:i + batch_size])
+                batches += 1
+                if batches % commit_every == 0:
+                    connection.commit()
+
+            count += len(rows)
+            logger.info(f"Imported {count} business hours records")
+
         connection.commit()
-        logger.debug("Batch insert successful")
+        logger.info(f"Completed importing business hours data. Total records: {count}")
     except Exception as e:
         connection.rollback()
-        logger.error(f"Error in batch insert: {e}")
-        raise e
+        logger.error(f"Error importing business hours data: {e}")
     finally:
         cursor.close()
         connection.close()
 
+def _insert_business_hours_batch(cursor, batch):
+    """Insert a batch of business hours records on the caller's connection"""
+    # Build one multi-row INSERT so the whole batch is a single wire packet
+    placeholders = ", ".join(["(%s, %s, %s, %s)"] * len(batch))
+    query = f"INSERT INTO business_hours (store_id, day_of_week, start_time_local, end_time_local) VALUES {placeholders}"
+    flat_params = [value for row in batch for value in row]
+    cursor.execute(query, flat_params)
+
 def import_store_timezones(file_path):
     """Import store timezone data from CSV"""
     if not os.path.exists(file_path):
         logger.error(f"Error: File not found - {file_path}")
         return
-    
+
+    # Make re-imports idempotent: replace the table contents rather than
+    # appending duplicates on every /import_data call
+    try:
+        execute_query("TRUNCATE TABLE store_timezones")
+    except Exception as e:
+        logger.error(f"Error truncating store_timezones: {e}")
+
     try:
         logger.info(f"Starting import of timezone data from {file_path}")
-        with open(file_path, 'r') as file:
-            reader = csv.DictReader(file)
-            batch_size = 1000
-            batch = []
-            count = 0
-            
-            for row in reader:
+        query = f"""
+        LOAD DATA LOCAL INFILE '{_escape_path(file_path)}'
+        INTO TABLE store_timezones
+        FIELDS TERMINATED BY ',' ENCLOSED BY '"'
+        IGNORE 1 LINES
+        (store_id, timezone_str)
+        """
+        count = _load_data_infile(query)
+        logger.info(f"Completed importing timezone data. Total records: {count}")
+    except Exception as e:
+        logger.error(f"Error bulk loading timezone data: {e}")
+        logger.info("Falling back to row-based import of timezone data")
+        _import_store_timezones_rows(file_path)
+
+def _import_store_timezones_rows(file_path):
+    """Row-based fallback import for servers without LOCAL INFILE support"""
+    connection = get_connection()
+    cursor = connection.cursor()
+    try:
+        batch_size = 1000
+        commit_every = 10
+        count = 0
+        batches = 0
+
+        for chunk in pd.read_csv(file_path, chunksize=100_000, dtype=str):
+            rows = []
+            for row in chunk.itertuples(index=False):
                 try:
-                    batch.append((
-                        row['store_id'],
-                        row['timezone_str']
+                    rows.append((
+                        row.store_id,
+                        row.timezone_str
                     ))
-                    count += 1
-                    
-                    if len(batch) >= batch_size:
-                        _insert_store_timezones_batch(batch)
-                        logger.info(f"Imported {count} timezone records")
-                        batch = []
                 except Exception as e:
                     logger.error(f"Error processing row: {row} - {e}")
                     continue
-            
-            # Insert remaining records
-            if batch:
-                _insert_store_timezones_batch(batch)
-                logger.info(f"Imported {count} timezone records")
-            
-            logger.info(f"Completed importing timezone data. Total records: {count}")
-    except Exception as e:
-        logger.error(f"Error importing timezone data: {e}")
 
-def _insert_store_timezones_batch(batch):
-    """Insert a batch of store timezone records"""
-    query = """
-    INSERT INTO store_timezones (store_id, timezone_str)
-    VALUES (%s, %s)
-    """
-    connection = get_connection()
-    cursor = connection.cursor()
-    try:
-        logger.debug(f"Executing batch insert of {len(batch)} timezone records")
-        cursor.executemany(query, batch)
+            for i in range(0, len(rows), batch_size):
+                _insert_store_timezones_batch(cursor, rows[i:i + batch_size])
+                batches += 1
+                if batches % commit_every == 0:
+                    connection.commit()
+
+            count += len(rows)
+            logger.info(f"Imported {count} timezone records")
+
         connection.commit()
-        logger.debug("Batch insert successful")
+        logger.info(f"Completed importing timezone data. Total records: {count}")
     except Exception as e:
         connection.rollback()
-        logger.error(f"Error in batch insert: {e}")
-        raise e
+        logger.error(f"Error importing timezone data: {e}")
     finally:
         cursor.close()
         connection.close()
 
+def _insert_store_timezones_batch(cursor, batch):
+    """Insert a batch of store timezone records on the caller's connection"""
+    # Build one multi-row INSERT so the whole batch is a single wire packet
+    placeholders = ", ".join(["(%s, %s)"] * len(batch))
+    query = f"INSERT INTO store_timezones (store_id, timezone_str) VALUES {placeholders}"
+    flat_params = [value for row in batch for value in row]
+    cursor.execute(query, flat_params)
+
+def ensure_indexes():
+    """Create the indexes the report and debug aggregates rely on"""
+    indexes = [
+        # Composite index turns the per-store observation range scan and the
+        # MIN/MAX + COUNT(DISTINCT) aggregates into index-only operations
+        "CREATE INDEX idx_ss_store_ts ON store_status(store_id, timestamp_utc)",
+        "CREATE INDEX idx_bh_store ON business_hours(store_id)",
+        "CREATE INDEX idx_tz_store ON store_timezones(store_id)",
+    ]
+    for statement in indexes:
+        try:
+            execute_query(statement)
+        except Exception as e:
+            # MySQL has no CREATE INDEX IF NOT EXISTS; 1061 means the
+            # index already exists, which is fine on re-import
+            if getattr(e, 'errno', None) == 1061:
+                continue
+            logger.error(f"Error creating index: {e}")
+
 def import_all_data(data_dir):
     """Import all data from CSV files"""
     logger.info(f"Starting data import from {data_dir}")
-    
+
     # Check if directory exists
     if not os.path.exists(data_dir):
         logger.error(f"Error: Data directory not found - {data_dir}")
         return
-    
+
     # Check if files exist
     store_status_path = os.path.join(data_dir, 'store_status.csv')
     business_hours_path = os.path.join(data_dir, 'menu_hours.csv')
     timezones_path = os.path.join(data_dir, 'timezones.csv')
-    
+
+    # The three imports target independent tables, so run them in parallel
+    tasks = []
+
     if not os.path.exists(store_status_path):
         logger.error(f"Error: File not found - {store_status_path}")
     else:
         logger.info(f"Importing store status data from {store_status_path}")
-        import_store_status(store_status_path)
-    
+        tasks.append((import_store_status, store_status_path))
+
     if not os.path.exists(business_hours_path):
         logger.error(f"Error: File not found - {business_hours_path}")
     else:
         logger.info(f"Importing business hours data from {business_hours_path}")
-        import_business_hours(business_hours_path)
-    
+        tasks.append((import_business_hours, business_hours_path))
+
     if not os.path.exists(timezones_path):
         logger.error(f"Error: File not found - {timezones_path}")
     else:
         logger.info(f"Importing timezone data from {timezones_path}")
-        import_store_timezones(timezones_path)
-    
-    logger.info("Data import completed") 
\ No newline at end of file
+        tasks.append((import_store_timezones, timezones_path))
+
+    if tasks:
+        with ThreadPoolExecutor(max_workers=len(tasks)) as executor:
+            futures = [executor.submit(func, path) for func, path in tasks]
+            for future in futures:
+                future.result()
+
+    ensure_indexes()
+
+    logger.info("Data import completed")
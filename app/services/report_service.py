@@ -1,233 +1,378 @@
+import io
 import os
+import time
 import uuid
 import csv
-import pytz
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from app.database import execute_query
+from app.database import execute_query, execute_query_async, execute_query_stream, POOL_SIZE
+from app.services.data_service import ensure_indexes
 import threading
 from app.logger import logger
-from app.utils.time_helper import TimeHelper
+from app.utils.time_helper import TimeHelper, normalize_business_hours
 
-def trigger_report():
+# Numba is optional: when present, the innermost window reduction runs as
+# a JIT-compiled fused loop; otherwise the NumPy expression below is used
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, cache=True)
+    def count_in_window(ts_i64, bh_mask, active, start_i64, end_i64):
+        """Count (business-hours, active) observations inside [start, end]
+
+        ts_i64 is sorted, so searchsorted bounds the window and the fused
+        loop accumulates both counters in one pass without the boolean
+        temporaries the NumPy expression allocates.
+        """
+        lo = np.searchsorted(ts_i64, start_i64, side='left')
+        hi = np.searchsorted(ts_i64, end_i64, side='right')
+        total = 0
+        active_total = 0
+        for i in prange(lo, hi):
+            if bh_mask[i]:
+                total += 1
+                if active[i]:
+                    active_total += 1
+        return total, active_total
+else:
+    def count_in_window(ts_i64, bh_mask, active, start_i64, end_i64):
+        """NumPy fallback with the same contract as the JIT kernel
+
+        ts_i64 is sorted, so binary-search the window bounds and reduce
+        only that slice - the hour window touches ~1/168th of the week's
+        observations instead of all of them.
+        """
+        lo = np.searchsorted(ts_i64, start_i64, side='left')
+        hi = np.searchsorted(ts_i64, end_i64, side='right')
+        counted = bh_mask[lo:hi]
+        return int(counted.sum()), int((counted & active[lo:hi]).sum())
+
+# In-process report status registry. Clients poll /get_report every few
+# seconds while a report runs, so serve status from memory instead of
+# hitting the DB pool on every poll. MySQL keeps the durable copy, which
+# is only consulted for reports created before a restart.
+REPORT_STATUS_TTL = 24 * 3600  # seconds
+
+REPORT_HEADER = (
+    'store_id',
+    'uptime_last_hour(in minutes)',
+    'uptime_last_day(in hours)',
+    'uptime_last_week(in hours)',
+    'downtime_last_hour(in minutes)',
+    'downtime_last_day(in hours)',
+    'downtime_last_week(in hours)'
+)
+_report_status = {}
+_report_status_lock = threading.Lock()
+
+def _set_local_status(report_id, status, file_path=None):
+    """Record a report's status in the in-process registry"""
+    with _report_status_lock:
+        _report_status[report_id] = {
+            'status': status,
+            'file_path': file_path,
+            'expires': time.time() + REPORT_STATUS_TTL,
+        }
+
+async def trigger_report():
     """Trigger a new report generation"""
     report_id = str(uuid.uuid4())
-    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    
+
     logger.info(f"Triggering report generation with ID: {report_id}")
-    
+
+    # NOW() lets the server fill the timestamp, keeping report times on
+    # the DB clock and skipping the Python-side formatting
     query = """
     INSERT INTO reports (report_id, status, created_at)
-    VALUES (%s, %s, %s)
+    VALUES (%s, %s, NOW())
     """
-    execute_query(query, (report_id, 'Running', now))
-    
+    await execute_query_async(query, (report_id, 'Running'))
+    _set_local_status(report_id, 'Running')
+
     # Start report generation in a separate thread
     thread = threading.Thread(target=generate_report, args=(report_id,))
     thread.daemon = True
     thread.start()
-    
+
     return report_id
 
-def get_report_status(report_id):
+async def get_report_status(report_id):
     """Get the status of a report"""
     logger.info(f"Checking status of report: {report_id}")
-    
+
+    # Fast path: serve from the in-process registry
+    with _report_status_lock:
+        entry = _report_status.get(report_id)
+    if entry is not None and time.time() < entry['expires']:
+        logger.info(f"Report status: {entry['status']}")
+        return {'status': entry['status'], 'file_path': entry['file_path']}
+
+    # Fall back to MySQL for reports created before a restart
     query = """
     SELECT status, file_path FROM reports
     WHERE report_id = %s
     """
-    results = execute_query(query, (report_id,), fetch=True)
-    
+    results = await execute_query_async(query, (report_id,), fetch=True)
+
     if not results:
         logger.warning(f"Report not found: {report_id}")
         return None
-    
+
     logger.info(f"Report status: {results[0]['status']}")
     return results[0]
 
+# ensure_indexes is cheap when the indexes exist, but only needs to run
+# once per process before the first report's scans
+_indexes_ensured = False
+
+# Reports triggered minutes apart share the same MAX(timestamp_utc), so
+# their per-store metrics are identical. Cache results keyed by store and
+# the current time rounded to the minute; the cache holds one time bucket
+# and resets when the data advances. lru_cache can't be used here because
+# the prefetched maps aren't hashable.
+_metrics_cache = {'bucket': None, 'entries': {}}
+_metrics_cache_lock = threading.Lock()
+
+def set_report_status(report_id, status, file_path=None):
+    """Persist a report state transition and mirror it in the registry"""
+    if file_path is not None:
+        query = """
+        UPDATE reports
+        SET status = %s, completed_at = NOW(), file_path = %s
+        WHERE report_id = %s
+        """
+        execute_query(query, (status, file_path, report_id))
+    else:
+        query = """
+        UPDATE reports
+        SET status = %s, completed_at = NOW()
+        WHERE report_id = %s
+        """
+        execute_query(query, (status, report_id))
+    _set_local_status(report_id, status, file_path)
+
 def generate_report(report_id):
     """Generate the report"""
+    global _indexes_ensured
+    # Every exit routes through the single set_report_status call in the
+    # finally block; the try body flips these on success
+    status = 'Error'
+    report_path = None
     try:
         logger.info(f"Starting report generation for ID: {report_id}")
-        
+
+        if not _indexes_ensured:
+            ensure_indexes()
+            _indexes_ensured = True
+
         # Get current time (max timestamp from observations)
         max_time_result = execute_query(
             "SELECT MAX(timestamp_utc) as max_time FROM store_status",
             fetch=True
         )
-        
+
         if not max_time_result or not max_time_result[0]['max_time']:
             logger.error("No data found in store_status table")
-            update_query = """
-            UPDATE reports
-            SET status = %s, completed_at = %s
-            WHERE report_id = %s
-            """
-            now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            execute_query(update_query, ('Error', now, report_id))
             return
-            
+
         current_time = max_time_result[0]['max_time']
+        if isinstance(current_time, str):
+            # fromisoformat accepts the space separator on 3.11+ and is
+            # several times faster than strptime
+            current_time = datetime.fromisoformat(current_time)
         logger.info(f"Using current time: {current_time}")
-        
+
         # Get all store IDs
         store_ids = execute_query(
             "SELECT DISTINCT store_id FROM store_status",
             fetch=True
         )
-        
+
         if not store_ids:
             logger.error("No store IDs found in store_status table")
-            update_query = """
-            UPDATE reports
-            SET status = %s, completed_at = %s
-            WHERE report_id = %s
-            """
-            now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            execute_query(update_query, ('Error', now, report_id))
             return
-        
+
+        # Prefetch timezones, business hours and the week's observations in
+        # three bulk queries instead of three queries per store
+        last_week = current_time - timedelta(weeks=1)
+
+        tz_map = {
+            row['store_id']: row['timezone_str']
+            for row in execute_query(
+                "SELECT store_id, timezone_str FROM store_timezones",
+                fetch=True
+            )
+        }
+
+        bh_map = {}
+        for row in execute_query(
+            "SELECT store_id, day_of_week, start_time_local, end_time_local FROM business_hours",
+            fetch=True
+        ):
+            bh_map.setdefault(row['store_id'], []).append(row)
+
+        # Observations are by far the largest result set - stream them in
+        # fetchmany batches rather than materializing a second full copy
+        obs_map = {}
+        for row in execute_query_stream(
+            """
+            SELECT store_id, timestamp_utc, status
+            FROM store_status
+            WHERE timestamp_utc >= %s
+            ORDER BY store_id, timestamp_utc
+            """,
+            (last_week,)
+        ):
+            obs_map.setdefault(row['store_id'], []).append(row)
+
         # Process stores in batches
         batch_size = 50  # Process 50 stores at a time
         reports_dir = os.path.join(os.getcwd(), 'reports')
         os.makedirs(reports_dir, exist_ok=True)
         file_path = os.path.join(reports_dir, f'report_{report_id}.csv')
         
-        with open(file_path, 'w', newline='') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=[
-                'store_id', 
-                'uptime_last_hour(in minutes)', 
-                'uptime_last_day(in hours)', 
-                'uptime_last_week(in hours)', 
-                'downtime_last_hour(in minutes)', 
-                'downtime_last_day(in hours)', 
-                'downtime_last_week(in hours)'
-            ])
-            writer.writeheader()
+        # A multi-MB write buffer keeps large reports from paying a syscall
+        # every 8 KiB (the default buffering of open())
+        raw_file = open(file_path, 'wb')
+        buffered = io.BufferedWriter(raw_file, buffer_size=4 * 1024 * 1024)
+        with io.TextIOWrapper(buffered, newline='', encoding='utf-8') as csvfile:
+            # Plain csv.writer with tuples avoids DictWriter's per-row dict
+            # allocation and fieldname lookups
+            writer = csv.writer(csvfile, dialect=csv.excel)
+            writer.writerow(REPORT_HEADER)
             
-            for i in range(0, len(store_ids), batch_size):
-                batch = store_ids[i:i + batch_size]
-                logger.info(f"Processing batch {i//batch_size + 1} of {(len(store_ids) + batch_size - 1)//batch_size}")
-                
-                for store in batch:
-                    store_id = store['store_id']
-                    logger.debug(f"Processing store: {store_id}")
-                    
-                    try:
-                        metrics = calculate_store_metrics(store_id, current_time)
-                        
-                        writer.writerow({
-                            'store_id': store_id,
-                            'uptime_last_hour(in minutes)': metrics['uptime_last_hour'],
-                            'uptime_last_day(in hours)': metrics['uptime_last_day'],
-                            'uptime_last_week(in hours)': metrics['uptime_last_week'],
-                            'downtime_last_hour(in minutes)': metrics['downtime_last_hour'],
-                            'downtime_last_day(in hours)': metrics['downtime_last_day'],
-                            'downtime_last_week(in hours)': metrics['downtime_last_week']
-                        })
-                    except Exception as e:
-                        logger.error(f"Error processing store {store_id}: {e}")
-                        # Continue with next store
+            # Metric calculation is independent per store, so fan each batch
+            # out to worker threads; CSV writes stay on this thread so the
+            # output order is preserved. Workers are capped below the sync
+            # pool size so per-store code that queries the DB can never
+            # exhaust the pool.
+            max_workers = min(32, (os.cpu_count() or 4) * 4, max(POOL_SIZE - 4, 1))
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                for i in range(0, len(store_ids), batch_size):
+                    batch = store_ids[i:i + batch_size]
+                    logger.info(f"Processing batch {i//batch_size + 1} of {(len(store_ids) + batch_size - 1)//batch_size}")
+
+                    results = list(executor.map(
+                        lambda store: (
+                            store['store_id'],
+                            calculate_store_metrics(store['store_id'], current_time,
+                                                    tz_map, bh_map, obs_map)
+                        ),
+                        batch
+                    ))
+
+                    # One writerows call per batch keeps the quoting and
+                    # dispatch overhead in csv's C loop instead of paying
+                    # it per row
+                    writer.writerows(
+                        (
+                            store_id,
+                            metrics['uptime_last_hour'],
+                            metrics['uptime_last_day'],
+                            metrics['uptime_last_week'],
+                            metrics['downtime_last_hour'],
+                            metrics['downtime_last_day'],
+                            metrics['downtime_last_week']
+                        )
+                        for store_id, metrics in results
+                    )
         
-        # Update report status
-        update_query = """
-        UPDATE reports
-        SET status = %s, completed_at = %s, file_path = %s
-        WHERE report_id = %s
-        """
-        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        execute_query(update_query, ('Complete', now, file_path, report_id))
+        status = 'Complete'
+        report_path = file_path
         logger.info(f"Report generation completed for ID: {report_id}")
-        
+
     except Exception as e:
         logger.error(f"Error generating report: {e}", exc_info=True)
-        update_query = """
-        UPDATE reports
-        SET status = %s, completed_at = %s
-        WHERE report_id = %s
-        """
-        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        execute_query(update_query, ('Error', now, report_id))
+    finally:
+        set_report_status(report_id, status, report_path)
 
-def calculate_store_metrics(store_id, current_time):
-    """Calculate uptime/downtime metrics for a store"""
+def calculate_store_metrics(store_id, current_time, tz_map, bh_map, obs_map):
+    """Calculate uptime/downtime metrics for a store from prefetched data"""
     try:
-        # Get store timezone
-        timezone_query = """
-        SELECT timezone_str FROM store_timezones
-        WHERE store_id = %s
-        """
-        timezone_result = execute_query(timezone_query, (store_id,), fetch=True)
-        timezone_str = timezone_result[0]['timezone_str'] if timezone_result else 'America/Chicago'
-        
+        if isinstance(current_time, str):
+            current_time = datetime.fromisoformat(current_time)
+
+        # Serve from the cache when another report already computed this
+        # store for the same time bucket
+        bucket = current_time.replace(second=0, microsecond=0)
+        with _metrics_cache_lock:
+            if _metrics_cache['bucket'] != bucket:
+                _metrics_cache['bucket'] = bucket
+                _metrics_cache['entries'].clear()
+            cached = _metrics_cache['entries'].get(store_id)
+        if cached is not None:
+            return cached
+
+        # Store timezone (default matches the import-time fallback)
+        timezone_str = tz_map.get(store_id, 'America/Chicago')
+
         # Initialize time helper
         time_helper = TimeHelper(timezone_str)
-        
-        # Get business hours
-        hours_query = """
-        SELECT day_of_week, start_time_local, end_time_local 
-        FROM business_hours
-        WHERE store_id = %s
-        """
-        business_hours = execute_query(hours_query, (store_id,), fetch=True)
-        
-        # If no business hours, assume 24/7
+
+        # Business hours, parsed to integer minutes once; if none, 24/7
+        business_hours = normalize_business_hours(bh_map.get(store_id, []))
         is_24x7 = len(business_hours) == 0
-        
+
         # Calculate time ranges
-        if isinstance(current_time, str):
-            current_time = datetime.strptime(current_time, '%Y-%m-%d %H:%M:%S')
-        
         last_hour = current_time - timedelta(hours=1)
         last_day = current_time - timedelta(days=1)
         last_week = current_time - timedelta(weeks=1)
-        
-        # Get observations
-        observations_query = """
-        SELECT timestamp_utc, status
-        FROM store_status
-        WHERE store_id = %s 
-        AND timestamp_utc >= %s
-        ORDER BY timestamp_utc
-        """
-        observations = execute_query(
-            observations_query, 
-            (store_id, last_week.strftime('%Y-%m-%d %H:%M:%S')),
-            fetch=True
-        )
-        
+
+        # Observations for the week, already sorted by timestamp
+        observations = obs_map.get(store_id, [])
+
         # Interpolation logic:
         # 1. For each time period, count observations during business hours
         # 2. Calculate uptime ratio based on these observations
         # 3. Apply ratio to total business hours in the period
-        
+
+        # Load the week's observations into arrays once; the three window
+        # computations then reduce over these instead of re-scanning and
+        # re-checking business hours per observation per window
+        if observations:
+            # One vectorized conversion for the whole column: datetime
+            # objects convert directly, and if the driver handed back
+            # strings this is a single C-level parse instead of a
+            # datetime.strptime per observation
+            ts = np.array([obs['timestamp_utc'] for obs in observations],
+                          dtype='datetime64[s]')
+            active = np.array([obs['status'] == 'active' for obs in observations],
+                              dtype=bool)
+            if is_24x7:
+                bh_mask = np.ones(len(observations), dtype=bool)
+            else:
+                # Parse the business hours once into a bit-packed
+                # minute-of-week lookup, then check every observation by
+                # array indexing into it
+                bh_bits = time_helper.build_business_hours_bits(business_hours)
+                bh_mask = time_helper.business_hours_mask(ts, bh_bits)
+        else:
+            ts = np.array([], dtype='datetime64[s]')
+            active = np.array([], dtype=bool)
+            bh_mask = np.array([], dtype=bool)
+
+        # The kernel works on epoch seconds; viewing the datetime64[s]
+        # array as int64 is free
+        ts_i64 = ts.view(np.int64)
+
         def calculate_period_metrics(start_time, end_time, total_time):
             """Calculate metrics for a specific time period"""
-            active_count = 0
-            total_count = 0
-            
-            for obs in observations:
-                # Handle both string and datetime objects
-                obs_time = obs['timestamp_utc']
-                if isinstance(obs_time, str):
-                    obs_time = datetime.strptime(obs_time, '%Y-%m-%d %H:%M:%S')
-                
-                if start_time <= obs_time <= end_time:
-                    # Convert to local time for business hours check
-                    local_time = time_helper.utc_to_local(obs_time)
-                    
-                    # Only count if within business hours
-                    if is_24x7 or time_helper.is_within_business_hours(local_time, business_hours):
-                        total_count += 1
-                        if obs['status'] == 'active':
-                            active_count += 1
-            
-            # Calculate uptime ratio
-            uptime_ratio = active_count / total_count if total_count > 0 else 0
-            
-            # Apply ratio to total time
-            return round(uptime_ratio * total_time, 2)
-        
+            total_count, active_count = count_in_window(
+                ts_i64, bh_mask, active,
+                np.datetime64(start_time, 's').astype(np.int64),
+                np.datetime64(end_time, 's').astype(np.int64)
+            )
+            if total_count == 0:
+                return 0
+
+            # Apply the uptime ratio to total time
+            return round(active_count / total_count * total_time, 2)
+
         # Calculate metrics for each period
         metrics = {}
         
@@ -242,7 +387,11 @@ def calculate_store_metrics(store_id, current_time):
         # Last week (in hours)
         metrics['uptime_last_week'] = calculate_period_metrics(last_week, current_time, 168)
         metrics['downtime_last_week'] = 168 - metrics['uptime_last_week']
-        
+
+        with _metrics_cache_lock:
+            if _metrics_cache['bucket'] == bucket:
+                _metrics_cache['entries'][store_id] = metrics
+
         return metrics
     except Exception as e:
         logger.error(f"Error calculating metrics for store {store_id}: {e}", exc_info=True)
@@ -255,100 +404,3 @@ def calculate_store_metrics(store_id, current_time):
             'downtime_last_day': 24,
             'downtime_last_week': 168
         }
-
-def calculate_uptime(observations, start_time, end_time, business_hours, timezone_str, is_24x7, unit='hours'):
-    """
-    Calculate uptime within a time range considering business hours
-    """
-    if not observations:
-        return 0
-    
-    # Convert to timezone
-    local_tz = pytz.timezone(timezone_str)
-    
-    # Count active observations
-    active_count = 0
-    total_count = len(observations)
-    
-    for o in observations:
-        # Handle both string and datetime timestamps
-        if o['status'] == 'active':
-            active_count += 1
-    
-    if total_count == 0:
-        return 0
-    
-    active_ratio = active_count / total_count
-    
-    # Calculate total business hours in the period
-    total_business_time = 0
-    
-    if is_24x7:
-        # If 24x7, use the entire time range
-        total_seconds = (end_time - start_time).total_seconds()
-        if unit == 'hours':
-            total_business_time = total_seconds / 3600  # Convert seconds to hours
-        else:  # minutes
-            total_business_time = total_seconds / 60  # Convert seconds to minutes
-    else:
-        # Calculate business hours for each day in the range
-        current_day = start_time
-        while current_day <= end_time:
-            day_of_week = current_day.weekday()  # 0 = Monday, 6 = Sunday
-            
-            # Find business hours for this day
-            day_hours = [h for h in business_hours if h['day_of_week'] == day_of_week]
-            
-            for hours in day_hours:
-                # Parse business hours - make sure we're working with strings
-                start_time_str = hours['start_time_local']
-                end_time_str = hours['end_time_local']
-                
-                # Handle different time formats
-                if isinstance(start_time_str, str) and ':' in start_time_str:
-                    start_parts = start_time_str.split(':')
-                    start_hour = int(start_parts[0])
-                    start_minute = int(start_parts[1]) if len(start_parts) > 1 else 0
-                else:
-                    # Default to midnight if format is unexpected
-                    start_hour, start_minute = 0, 0
-                
-                if isinstance(end_time_str, str) and ':' in end_time_str:
-                    end_parts = end_time_str.split(':')
-                    end_hour = int(end_parts[0])
-                    end_minute = int(end_parts[1]) if len(end_parts) > 1 else 0
-                else:
-                    # Default to midnight if format is unexpected
-                    end_hour, end_minute = 0, 0
-                
-                # Calculate business hours for this day
-                business_start = datetime(
-                    current_day.year, current_day.month, current_day.day,
-                    start_hour, start_minute
-                )
-                business_end = datetime(
-                    current_day.year, current_day.month, current_day.day,
-                    end_hour, end_minute
-                )
-                
-                # Handle overnight business hours
-                if end_hour < start_hour:
-                    business_end = business_end + timedelta(days=1)
-                
-                # Adjust for time range
-                if business_start < start_time:
-                    business_start = start_time
-                if business_end > end_time:
-                    business_end = end_time
-                
-                if business_end > business_start:
-                    business_seconds = (business_end - business_start).total_seconds()
-                    if unit == 'hours':
-                        total_business_time += business_seconds / 3600
-                    else:  # minutes
-                        total_business_time += business_seconds / 60
-            
-            current_day += timedelta(days=1)
-    
-    # Apply active ratio to total business time
-    return round(active_ratio * total_business_time, 2) 
\ No newline at end of file
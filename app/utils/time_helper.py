@@ -1,74 +1,135 @@
-import pytz
-from datetime import datetime, timedelta
+import numpy as np
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+@lru_cache(maxsize=None)
+def _get_timezone(timezone_str):
+    """Cached ZoneInfo factory - construction reads the tz database, so
+    share one instance per zone name across all stores"""
+    return ZoneInfo(timezone_str)
+
+def _to_minute_of_day(value, default):
+    """Convert a local time value (HH:MM[:SS] string or timedelta) to minute-of-day"""
+    if isinstance(value, str) and ':' in value:
+        parts = value.split(':')
+        return int(parts[0]) * 60 + int(parts[1])
+    if isinstance(value, timedelta):
+        total_seconds = int(value.total_seconds())
+        return (total_seconds // 60) % 1440
+    return default
+
+def normalize_business_hours(business_hours):
+    """Parse raw business_hours rows into integer minute-of-day fields
+
+    Each row is parsed exactly once when a store's hours are loaded, so
+    every later check is an integer comparison instead of repeating the
+    string/timedelta handling per observation.
+    """
+    normalized = []
+    for hours in business_hours:
+        start_min = _to_minute_of_day(hours['start_time_local'], 0)
+        end_min = _to_minute_of_day(hours['end_time_local'], 1439)
+        normalized.append({
+            'day': int(hours['day_of_week']),
+            'start_min': start_min,
+            'end_min': end_min,
+            'overnight': end_min < start_min,
+        })
+    return normalized
+
+# 1970-01-01 (epoch day 0) was a Thursday; weekday() counts Monday as 0
+_WEEKDAY_EPOCH_OFFSET = 3
 
 class TimeHelper:
     def __init__(self, timezone_str='America/Chicago'):
-        self.timezone = pytz.timezone(timezone_str)
+        self.timezone = _get_timezone(timezone_str)
+
+    def _offset_at(self, epoch_secs):
+        """UTC offset of this zone, in seconds, at a given epoch second"""
+        dt = datetime.fromtimestamp(int(epoch_secs), tz=timezone.utc)
+        return int(dt.astimezone(self.timezone).utcoffset().total_seconds())
+
+    def local_of_batch(self, ts_utc):
+        """Convert a sorted datetime64[s] array to local wall-clock epoch seconds
+
+        Between DST transitions the conversion is just utc + fixed_offset,
+        and a week of observations crosses at most one or two transitions.
+        Bisect for the transition points and add each segment's offset with
+        a vectorized slice add instead of one astimezone call per element.
+        """
+        secs = np.asarray(ts_utc, dtype='datetime64[s]').view(np.int64)
+        local = np.empty_like(secs)
+        lo = 0
+        while lo < secs.size:
+            offset = self._offset_at(secs[lo])
+            if self._offset_at(secs[-1]) == offset:
+                local[lo:] = secs[lo:] + offset
+                break
+            # Bisect for the first index past the next offset change
+            a, b = lo, secs.size - 1
+            while a + 1 < b:
+                mid = (a + b) // 2
+                if self._offset_at(secs[mid]) == offset:
+                    a = mid
+                else:
+                    b = mid
+            local[lo:b] = secs[lo:b] + offset
+            lo = b
+        return local
+
+    def build_business_hours_bitmap(self, business_hours):
+        """Build a 7x1440 (weekday x minute-of-day) business-hours lookup
+
+        Takes rows normalized by normalize_business_hours; membership
+        checks become a single array index instead of parsing per call.
+        """
+        bitmap = np.zeros((7, 1440), dtype=bool)
+        for hours in business_hours:
+            day = hours['day']
+            if hours['overnight']:
+                # Overnight hours wrap past midnight into the next day
+                bitmap[day, hours['start_min']:] = True
+                bitmap[(day + 1) % 7, :hours['end_min'] + 1] = True
+            else:
+                bitmap[day, hours['start_min']:hours['end_min'] + 1] = True
+        return bitmap
+
+    def build_business_hours_bits(self, business_hours):
+        """Bit-packed business-hours lookup: one bit per minute of the week
+
+        The packed form is 1260 bytes (10080 bits), small enough to stay
+        resident in L1 cache while a store's observations are checked.
+        """
+        return np.packbits(self.build_business_hours_bitmap(business_hours).ravel())
+
+    def business_hours_mask(self, utc_times, bh_bits):
+        """Business-hours membership for sorted UTC timestamps
+
+        Weekday and minute-of-day fall out of the local epoch seconds with
+        integer arithmetic; the minute-of-week then indexes the packed bit
+        array with a shift and mask, so the whole check is array ops end
+        to end.
+        """
+        local = self.local_of_batch(utc_times)
+        weekdays = ((local // 86400) + _WEEKDAY_EPOCH_OFFSET) % 7
+        minutes = (local // 60) % 1440
+        mow = weekdays * 1440 + minutes
+        # packbits stores the most significant bit first within each byte
+        return ((bh_bits[mow >> 3] >> (7 - (mow & 7))) & 1).astype(bool)
     
     def utc_to_local(self, utc_time):
         """Convert UTC time to local time"""
-        # Handle string timestamps
+        # Handle string timestamps; fromisoformat accepts the space
+        # separator on 3.11+ and is several times faster than strptime
         if isinstance(utc_time, str):
-            utc_time = datetime.strptime(utc_time, '%Y-%m-%d %H:%M:%S')
+            utc_time = datetime.fromisoformat(utc_time)
         
-        # Add UTC timezone if not present
+        # Attach UTC if not present; replace() is enough since UTC has
+        # no DST to resolve
         if utc_time.tzinfo is None:
-            utc_time = pytz.UTC.localize(utc_time)
-            
+            utc_time = utc_time.replace(tzinfo=timezone.utc)
+
+
         # Convert to local time
-        return utc_time.astimezone(self.timezone)
-    
-    def is_within_business_hours(self, local_time, business_hours):
-        """Check if time falls within business hours"""
-        day_of_week = local_time.weekday()
-        time_str = local_time.strftime('%H:%M')
-        
-        # If no business hours, assume 24/7
-        if not business_hours:
-            return True
-        
-        # Check each business hours entry for this day
-        for hours in business_hours:
-            if hours['day_of_week'] == day_of_week:
-                # Make sure we're working with strings
-                start_time_str = hours['start_time_local']
-                end_time_str = hours['end_time_local']
-                
-                # Handle different formats
-                if isinstance(start_time_str, str) and ':' in start_time_str:
-                    start_parts = start_time_str.split(':')
-                    start_time = start_parts[0] + ':' + start_parts[1]
-                elif isinstance(start_time_str, timedelta):
-                    # Convert timedelta to string in HH:MM format
-                    total_seconds = int(start_time_str.total_seconds())
-                    hours = total_seconds // 3600
-                    minutes = (total_seconds % 3600) // 60
-                    start_time = f"{hours:02d}:{minutes:02d}"
-                else:
-                    # Default
-                    start_time = "00:00"
-                
-                if isinstance(end_time_str, str) and ':' in end_time_str:
-                    end_parts = end_time_str.split(':')
-                    end_time = end_parts[0] + ':' + end_parts[1]
-                elif isinstance(end_time_str, timedelta):
-                    # Convert timedelta to string in HH:MM format
-                    total_seconds = int(end_time_str.total_seconds())
-                    hours = total_seconds // 3600
-                    minutes = (total_seconds % 3600) // 60
-                    end_time = f"{hours:02d}:{minutes:02d}"
-                else:
-                    # Default
-                    end_time = "23:59"
-                
-                # Handle overnight hours (end time earlier than start time)
-                if end_time < start_time:
-                    # Either before midnight after start time, or after midnight before end time
-                    if time_str >= start_time or time_str <= end_time:
-                        return True
-                else:
-                    # Normal case: start_time <= time_str <= end_time
-                    if start_time <= time_str <= end_time:
-                        return True
-        
-        return False 
\ No newline at end of file
+        return utc_time.astimezone(self.timezone) 
\ No newline at end of file